@@ -13,3 +13,6 @@ THIS_AGENT_DID = os.getenv("THIS_AGENT_DID")
 SCRIPT_GENERATOR_DID = os.getenv("SCRIPT_GENERATOR_DID")
 CHARACTER_EXTRACTOR_DID = os.getenv("CHARACTER_EXTRACTOR_DID")
 IMAGE_GENERATOR_DID = os.getenv("IMAGE_GENERATOR_DID")
+
+# Send all character prompts to the Image Generator as a single batched task
+IMAGE_BATCH_ENABLED = os.getenv("IMAGE_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
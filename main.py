@@ -1,6 +1,7 @@
 import asyncio
 from payments.payments_instance import initialize_payments
 from orchestrator import OrchestratorAgent
+from utils.log_message import flush_logs
 from config.env import THIS_AGENT_DID
 
 async def main():
@@ -9,7 +10,7 @@ async def main():
     agent = OrchestratorAgent(payments)
 
     # Subscribe to the ai_protocol with the agent's `run` method
-    subscription_task = asyncio.get_event_loop().create_task(
+    subscription_task = asyncio.create_task(
         payments.ai_protocol.subscribe(
             agent.run, 
             join_account_room=False, 
@@ -21,6 +22,9 @@ async def main():
         await subscription_task
     except asyncio.CancelledError:
         print("Subscription task was cancelled")
+    finally:
+        # Make sure queued task logs reach Nevermined before exiting
+        await flush_logs()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,21 +1,107 @@
 import asyncio
+import contextlib
+import functools
 import json
+import random
+import orjson
 from payments_py.utils import generate_step_id
 from payments_py.data_models import AgentExecutionStatus
 from payments.ensure_balance import ensure_sufficient_balance
 from logger.logger import logger
 from utils.log_message import log_message
+from utils.run_sync import run_sync
 from config.env import (
     SCRIPT_GENERATOR_DID,
     CHARACTER_EXTRACTOR_DID,
     IMAGE_GENERATOR_DID,
     THIS_PLAN_DID,
     IMAGE_GENERATOR_PLAN_DID,
+    IMAGE_BATCH_ENABLED,
 )
 
+# Plain string values of the execution statuses compared against on every event
+_STATUS_PENDING = AgentExecutionStatus.Pending.value
+_STATUS_COMPLETED = AgentExecutionStatus.Completed.value
+_STATUS_FAILED = AgentExecutionStatus.Failed.value
+
+# Step fields the handlers read; events carrying all of them don't need a get_step round-trip
+_STEP_FIELDS = frozenset(("task_id", "step_id", "step_status", "name", "input_query", "did", "input_artifacts"))
+
+# Steps created by the init step, in execution order, as (name, is_last)
+_STEP_TEMPLATES = (
+    ("generateScript", False),
+    ("extractCharacters", False),
+    ("generateImagesForCharacters", True),
+)
+
+# Maximum number of image generation tasks in flight for a single step
+IMAGE_CONCURRENCY = 5
+# Seconds to wait before each retry of a task the Image Generator failed to accept
+BACKOFF = (2, 5, 15)
+
+
+def _decode_artifacts(output_artifacts):
+    """
+    Returns sub-agent output artifacts as native values so the next step doesn't decode them again.
+    JSON-encoded strings are decoded; plain-text artifacts (e.g. a generated script) are returned unchanged.
+    """
+    if isinstance(output_artifacts, str):
+        try:
+            return orjson.loads(output_artifacts)
+        except orjson.JSONDecodeError:
+            pass
+    return output_artifacts
+
+
+class TaskCreationError(Exception):
+    """Raised when a sub-agent rejects task creation; safe to retry since no work was started."""
+
+
+class _TaskCompletionHandler:
+    """
+    Callback passed to create_task that receives the sub-agent's task logs.
+    Once the task completes (or fails, when `report_failure` is set), `done` is set and
+    `result` or `exc` holds the outcome. Otherwise failures are logged like any other update.
+    """
+    __slots__ = ("orchestrator", "step", "validate_fn", "report_failure", "done", "result", "exc")
+
+    def __init__(self, orchestrator, step, validate_fn, report_failure=True):
+        self.orchestrator = orchestrator
+        self.step = step
+        self.validate_fn = validate_fn
+        self.report_failure = report_failure
+        self.done = asyncio.Event()
+        self.result = None
+        self.exc = None
+
+    async def __call__(self, data):
+        """Handles updates from the sub-agent's task."""
+        task_log = orjson.loads(data)
+        task_status = task_log.get("task_status", None)
+        if task_status == _STATUS_COMPLETED:
+            self.result = await self.validate_fn(task_log["task_id"])
+            logger.debug("Finished task %s: %s", task_log["task_id"], self.result)
+            self.done.set()
+        elif task_status == _STATUS_FAILED and self.report_failure:
+            await log_message(self.orchestrator.payments, self.step["task_id"], "error", task_log['message'], AgentExecutionStatus.Failed)
+            logger.debug("Task failed %s: %s", task_log["task_id"], task_log)
+            self.exc = Exception("Sub-agent task failed")
+            self.done.set()
+        else:
+            logger.debug("Task info: %s", task_log)
+            await log_message(self.orchestrator.payments, self.step["task_id"], "info", task_log['message'])
+
+
 class OrchestratorAgent:
     def __init__(self, payments):
         self.payments = payments
+        # Step name -> coroutine function handling that step
+        self._handlers = {
+            "init": self.handle_init_step,
+            "generateScript": lambda step: self.handle_step_with_agent(step, SCRIPT_GENERATOR_DID, "Script Generator", THIS_PLAN_DID),
+            "extractCharacters": lambda step: self.handle_step_with_agent(step, CHARACTER_EXTRACTOR_DID, "Character Extractor", THIS_PLAN_DID),
+            "generateImagesForCharacters": self.handle_image_generation_for_characters,
+        }
 
     async def run(self, data):
         """
@@ -27,32 +113,35 @@ class OrchestratorAgent:
             data: The incoming step data from the subscription.
         """
         logger.info(f"Received event: {data}")
-        step = self.payments.ai_protocol.get_step(data["step_id"])
+        if _STEP_FIELDS.issubset(data):
+            step = data
+        else:
+            step = await run_sync(self.payments.ai_protocol.get_step, data["step_id"])
 
-        await log_message(
-            self.payments, 
-            step["task_id"], 
-            "info", 
-            f"Processing Step {step['step_id']} [{step['step_status']}]: {step['input_query']}", 
-            AgentExecutionStatus.Pending
-        )
+        task_id = step["task_id"]
+        step_id = step["step_id"]
+        status = step["step_status"]
+        name = step["name"]
 
         # Only process steps with status "Pending"
-        if step["step_status"] != "Pending":
-            logger.warning(f"{step['task_id']} :: Step {step['step_id']} is not pending. Skipping.")
+        if status != _STATUS_PENDING:
+            logger.warning(f"{task_id} :: Step {step_id} is not pending [{status}]. Skipping.")
             return
 
         # Route step to the appropriate handler
-        if step["name"] == "init":
-            await self.handle_init_step(step)
-        elif step["name"] == "generateScript":
-            await self.handle_step_with_agent(step, SCRIPT_GENERATOR_DID, "Script Generator", THIS_PLAN_DID)
-        elif step["name"] == "extractCharacters":
-            await self.handle_step_with_agent(step, CHARACTER_EXTRACTOR_DID, "Character Extractor", THIS_PLAN_DID)
-        elif step["name"] == "generateImagesForCharacters":
-            await self.handle_image_generation_for_characters(step)
-        else:
-            logger.warning(f"Unrecognized step name: {step['name']}. Skipping.")
+        handler = self._handlers.get(name)
+        if handler is None:
+            logger.warning(f"Unrecognized step name: {name}. Skipping.")
+            return
+
+        await log_message(
+            self.payments, 
+            task_id, 
+            "info", 
+            f"Processing Step {step_id} [{status}]: {step['input_query']}", 
+            AgentExecutionStatus.Pending
+        )
+        await handler(step)
 
 
     async def handle_init_step(self, step):
@@ -62,22 +151,22 @@ class OrchestratorAgent:
         Args:
             step: The current step being processed.
         """
-        script_step_id = generate_step_id()
-        character_step_id = generate_step_id()
-        image_step_id = generate_step_id()
+        did = step["did"]
+        task_id = step["task_id"]
+        step_id = step["step_id"]
+        ids = [generate_step_id() for _ in _STEP_TEMPLATES]
 
-        # Define the steps with their predecessors
+        # Define the steps, each one preceded by the previous step (the first by the init step)
         steps = [
-            {"step_id": script_step_id, "task_id": step["task_id"], "predecessor": step["step_id"], "name": "generateScript", "is_last": False},
-            {"step_id": character_step_id, "task_id": step["task_id"], "predecessor": script_step_id, "name": "extractCharacters", "is_last": False},
-            {"step_id": image_step_id, "task_id": step["task_id"], "predecessor": character_step_id, "name": "generateImagesForCharacters", "is_last": True},
+            {"step_id": ids[i], "task_id": task_id, "predecessor": ids[i - 1] if i else step_id, "name": name, "is_last": is_last}
+            for i, (name, is_last) in enumerate(_STEP_TEMPLATES)
         ]
 
-        self.payments.ai_protocol.create_steps(step["did"], step["task_id"], {"steps": steps})
-        await log_message(self.payments, step["task_id"], "info", "Steps created successfully.")
+        await run_sync(self.payments.ai_protocol.create_steps, did, task_id, {"steps": steps})
+        await log_message(self.payments, task_id, "info", "Steps created successfully.")
 
         # Mark the init step as completed
-        self.payments.ai_protocol.update_step(step["did"], step["task_id"], step_id=step["step_id"], step={"step_status": "Completed", "output": step["input_query"]})
+        await run_sync(self.payments.ai_protocol.update_step, did, task_id, step_id=step_id, step={"step_status": _STATUS_COMPLETED, "output": step["input_query"]})
 
 
     async def handle_step_with_agent(self, step, agent_did, agent_name, plan_did):
@@ -95,15 +184,14 @@ class OrchestratorAgent:
             return
 
         task_data = {"query": step["input_query"], "name": step["name"], "additional_params": [], "artifacts": []}
+        handler = _TaskCompletionHandler(
+            self,
+            step,
+            functools.partial(self.validate_generic_task, agent_did=agent_did, parent_step=step),
+            report_failure=False,
+        )
 
-        async def task_callback(data):
-            task_log = json.loads(data)
-            if task_log.get("task_status", None) == "Completed":
-                await self.validate_generic_task(task_log["task_id"], agent_did, step)
-            else:
-                await log_message(self.payments, step["task_id"], "info", task_log['message'])
-
-        result = await self.payments.ai_protocol.create_task(agent_did, task_data, task_callback)
+        result = await self.payments.ai_protocol.create_task(agent_did, task_data, handler)
         if getattr(result, "status_code", 0) == 201:
             await log_message(self.payments, step["task_id"], "info", "Task created successfully.")
         else:
@@ -124,37 +212,82 @@ class OrchestratorAgent:
         Args:
             step: The current step being processed.
         """
-        characters = json.loads(step.get("input_artifacts", "[]"))
-        tasks = []
-        characters_json = json.loads(characters)
+        did = step["did"]
+        task_id = step["task_id"]
+        step_id = step["step_id"]
+
+        characters_json = step.get("input_artifacts") or []
+        try:
+            if isinstance(characters_json, str):
+                characters_json = orjson.loads(characters_json)
+            # Older producers double-encode the artifacts as a JSON string
+            if isinstance(characters_json, str):
+                characters_json = orjson.loads(characters_json)
+        except orjson.JSONDecodeError:
+            characters_json = None
+
+        if not isinstance(characters_json, list):
+            await run_sync(self.payments.ai_protocol.update_step, did, task_id, step_id=step_id, step={"step_status": _STATUS_FAILED, "output": "Invalid character artifacts."})
+            await log_message(
+                self.payments, 
+                task_id, 
+                "error", 
+                "Invalid character artifacts: expected a JSON list of characters.", 
+                AgentExecutionStatus.Failed
+            )
+            return
 
         has_balance = await ensure_sufficient_balance(
             IMAGE_GENERATOR_PLAN_DID, self.payments, len(characters_json)
         )
         if not has_balance:
             raise Exception("Insufficient balance for image generation tasks.")
-        
-        for character in characters_json:
-            prompt = self.generate_text_to_image_prompt(character)
-            tasks.append(self.query_agent_with_prompt(step, prompt, "Image Generator", self.validate_image_generation_task))
+
+        prompts = [self.generate_text_to_image_prompt(character) for character in characters_json]
+        batched = IMAGE_BATCH_ENABLED and len(prompts) > 1
+
+        if batched:
+            # Submit every prompt in a single task; the sub-agent returns all artifacts at once
+            tasks = [asyncio.create_task(self.query_agent_with_backoff(
+                step,
+                json.dumps(prompts),
+                "Image Generator",
+                self.validate_image_generation_task,
+                additional_params=[{"batch": True}],
+            ))]
+        else:
+            # Bound how many per-character tasks are in flight at once
+            semaphore = asyncio.Semaphore(IMAGE_CONCURRENCY)
+            tasks = [
+                asyncio.create_task(self.query_agent_with_backoff(step, prompt, "Image Generator", self.validate_image_generation_task, semaphore=semaphore))
+                for prompt in prompts
+            ]
 
         try:
             print("Awaiting image tasks...")
-            artifacts = await asyncio.gather(*tasks, return_exceptions=False)
+            try:
+                results = await asyncio.gather(*tasks, return_exceptions=False)
+            except BaseException:
+                # gather leaves the remaining tasks running when one fails, so cancel them explicitly
+                for task in tasks:
+                    task.cancel()
+                raise
+            # Fan-out keeps one artifact list per character; a batched task already returns that list
+            artifacts = results[0] if batched else results
             print("All image tasks completed.")
             await log_message(
                 self.payments, 
-                step["task_id"], 
+                task_id, 
                 "info", 
                 "All image tasks completed.", 
                 AgentExecutionStatus.Completed
             )
-            self.payments.ai_protocol.update_step(step["did"], step["task_id"], step_id=step["step_id"], step={"step_status": "Completed", "output": "All image tasks completed.", "output_artifacts": artifacts})
+            await run_sync(self.payments.ai_protocol.update_step, did, task_id, step_id=step_id, step={"step_status": _STATUS_COMPLETED, "output": "All image tasks completed.", "output_artifacts": artifacts})
         except Exception as e:
-            self.payments.ai_protocol.update_step(step["did"], step["task_id"], step_id=step["step_id"], step={"step_status": "Failed", "output": "One or more image tasks failed."})
+            await run_sync(self.payments.ai_protocol.update_step, did, task_id, step_id=step_id, step={"step_status": _STATUS_FAILED, "output": "One or more image tasks failed."})
             await log_message(
                 self.payments, 
-                step["task_id"], 
+                task_id, 
                 "error", 
                 f"Error during image tasks: {str(e)}", 
                 AgentExecutionStatus.Failed
@@ -170,9 +303,38 @@ class OrchestratorAgent:
         Returns:
             str: The generated prompt string.
         """
-        return ", ".join(value for key, value in character.items() if key != "name")
+        attributes = character.copy()
+        attributes.pop("name", None)
+        return ", ".join(attributes.values())
+
+    async def query_agent_with_backoff(self, step, prompt, agent_name, validate_task_fn, additional_params=None, semaphore=None):
+        """
+        Queries an agent through query_agent_with_prompt, optionally bounded by a semaphore, and retried
+        with backoff when the task could not be created.
+
+        Args:
+            step: The current step being processed.
+            prompt: The input prompt for the agent.
+            agent_name: The agent's name, for logging purposes.
+            validate_task_fn: Function to validate task completion.
+            additional_params: Optional extra parameters sent along with the task (e.g. batch mode).
+            semaphore: Optional semaphore limiting how many tasks run concurrently; None means no bound.
 
-    async def query_agent_with_prompt(self, step, prompt, agent_name, validate_task_fn):
+        Returns:
+            The artifacts produced by the agent's task.
+        """
+        async with semaphore or contextlib.nullcontext():
+            for attempt, delay in enumerate((0, *BACKOFF)):
+                if delay:
+                    await asyncio.sleep(delay + random.uniform(0, 0.5))
+                try:
+                    return await self.query_agent_with_prompt(step, prompt, agent_name, validate_task_fn, additional_params)
+                except TaskCreationError as e:
+                    if attempt == len(BACKOFF):
+                        raise
+                    logger.warning(f"{step['task_id']} :: {e}. Retrying ({attempt + 1}/{len(BACKOFF)})...")
+
+    async def query_agent_with_prompt(self, step, prompt, agent_name, validate_task_fn, additional_params=None):
         """
         Queries an agent with a prompt, validates the task, and resolves with artifacts.
 
@@ -181,40 +343,27 @@ class OrchestratorAgent:
             prompt: The input prompt for the agent.
             agent_name: The agent's name, for logging purposes.
             validate_task_fn: Function to validate task completion.
+            additional_params: Optional extra parameters sent along with the task (e.g. batch mode).
 
         Returns:
             The artifacts produced by the agent's task.
         """
-        # Create a Future object to track completion
-        task_future = asyncio.get_event_loop().create_future()
-
-        async def task_callback(data):
-            """Handles updates from the sub-agent's task."""
-            print(':::RECEIVING TASK LOG EVENT:::')
-            task_log = json.loads(data)
-            if task_log.get("task_status", None) == AgentExecutionStatus.Completed.value:
-                artifacts = await validate_task_fn(task_log["task_id"])
-                print("Finished task:", task_log["task_id"], artifacts)
-                task_future.set_result(artifacts)  # Mark task as completed with artifacts
-            elif task_log.get("task_status", None) == AgentExecutionStatus.Failed.value:
-                await log_message(self.payments, step["task_id"], "error", task_log['message'], AgentExecutionStatus.Failed)
-                print("Task failed:", task_log["task_id"], task_log)
-                task_future.set_exception(Exception("Sub-agent task failed"))
-            else:
-                print("Task info:", task_log)
-                await log_message(self.payments, step["task_id"], "info", task_log['message'])
+        handler = _TaskCompletionHandler(self, step, validate_task_fn)
 
         # Define task data and create the task
-        task_data = {"query": prompt, "name": step["name"], "additional_params": [], "artifacts": []}
+        task_data = {"query": prompt, "name": step["name"], "additional_params": additional_params or [], "artifacts": []}
         result = await self.payments.ai_protocol.create_task(
-            IMAGE_GENERATOR_DID, task_data, task_callback
+            IMAGE_GENERATOR_DID, task_data, handler
         )
 
         if result.status_code != 201:
-            raise Exception(f"Error creating task for {agent_name}: {result.data}")
+            raise TaskCreationError(f"Error creating task for {agent_name}: {result.data}")
 
-        # Await the Future until task_callback sets the result or exception
-        return await task_future
+        # Wait until the handler records the result or exception
+        await handler.done.wait()
+        if handler.exc is not None:
+            raise handler.exc
+        return handler.result
 
     
     async def validate_generic_task(self, task_id, agent_did, parent_step):
@@ -227,18 +376,20 @@ class OrchestratorAgent:
             access_config: Access configuration required to query the agent's data.
             parent_step: The parent step that initiated the task.
         """
-        task_result = self.payments.ai_protocol.get_task_with_steps(agent_did, task_id)
+        task_result = await run_sync(self.payments.ai_protocol.get_task_with_steps, agent_did, task_id)
         task_data = task_result.json()
 
-        status = "Completed" if task_data["task"]["task_status"] == "Completed" else "Failed"
-        self.payments.ai_protocol.update_step(
+        status = _STATUS_COMPLETED if task_data["task"]["task_status"] == _STATUS_COMPLETED else _STATUS_FAILED
+        output_artifacts = _decode_artifacts(task_data["task"].get("output_artifacts", []))
+        await run_sync(
+            self.payments.ai_protocol.update_step,
             parent_step["did"], 
             parent_step["task_id"], 
             step_id=parent_step["step_id"], 
             step={
                 "step_status": status, 
                 "output": task_data["task"].get("output", "Error during task execution"), 
-                "output_artifacts": task_data["task"].get("output_artifacts", [])
+                "output_artifacts": output_artifacts
             }
         )
 
@@ -254,6 +405,9 @@ class OrchestratorAgent:
         Returns:
             list: An array of output artifacts generated by the task.
         """
-        task_result = self.payments.ai_protocol.get_task_with_steps(IMAGE_GENERATOR_DID, task_id)
+        task_result = await run_sync(self.payments.ai_protocol.get_task_with_steps, IMAGE_GENERATOR_DID, task_id)
         task_json = task_result.json()
-        return task_json["task"].get("output_artifacts", [])
+        output_artifacts = _decode_artifacts(task_json["task"].get("output_artifacts", []))
+        if not isinstance(output_artifacts, list):
+            output_artifacts = [output_artifacts]
+        return output_artifacts
@@ -1,14 +1,44 @@
+import asyncio
+import time
 from logger.logger import logger
+from utils.run_sync import run_sync
+
+# Seconds a fetched plan balance is trusted before querying Nevermined again
+BALANCE_CACHE_TTL = 5.0
+
+# plan_did -> (expiry on the monotonic clock, last known balance)
+_balance_cache: dict[str, tuple[float, int]] = {}
+_balance_locks: dict[str, asyncio.Lock] = {}
+
 
 async def ensure_sufficient_balance(plan_did, payments, required_balance=1):
     """Ensures the plan has sufficient balance and orders credits if necessary."""
-    logger.info(f"Checking balance for plan {plan_did}...")
-    balance = payments.get_plan_balance(plan_did)
-
-    if int(balance.balance) < required_balance:
-        logger.info(f"Balance insufficient for plan {plan_did}. Required: {required_balance}, Available: {balance.balance}. Ordering credits...")
-        response = payments.order_plan(plan_did)
-        if not response.success:
-            logger.error(f"Failed to order credits for plan {plan_did}.")
-            return False
-    return True
+    lock = _balance_locks.get(plan_did)
+    if lock is None:
+        lock = _balance_locks[plan_did] = asyncio.Lock()
+    async with lock:
+        now = time.monotonic()
+        cached = _balance_cache.get(plan_did)
+        if cached is not None:
+            expiry, cached_balance = cached
+            if expiry > now and cached_balance >= required_balance:
+                # Debit locally so back-to-back steps can't overspend the cached value
+                _balance_cache[plan_did] = (expiry, cached_balance - required_balance)
+                return True
+
+        logger.info(f"Checking balance for plan {plan_did}...")
+        balance = await run_sync(payments.get_plan_balance, plan_did)
+        available = int(balance.balance)
+
+        if available < required_balance:
+            logger.info(f"Balance insufficient for plan {plan_did}. Required: {required_balance}, Available: {balance.balance}. Ordering credits...")
+            # The balance changes after ordering, so force a fresh query next time
+            _balance_cache.pop(plan_did, None)
+            response = await run_sync(payments.order_plan, plan_did)
+            if not response.success:
+                logger.error(f"Failed to order credits for plan {plan_did}.")
+                return False
+            return True
+
+        _balance_cache[plan_did] = (now + BALANCE_CACHE_TTL, available - required_balance)
+        return True
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from payments import ensure_balance
+from payments.ensure_balance import ensure_sufficient_balance, BALANCE_CACHE_TTL
+
+
+class FakePayments:
+    def __init__(self, balances, order_success=True):
+        self.balances = list(balances)
+        self.order_success = order_success
+        self.balance_calls = 0
+        self.order_calls = 0
+
+    def get_plan_balance(self, plan_did):
+        self.balance_calls += 1
+        return SimpleNamespace(balance=str(self.balances.pop(0)))
+
+    def order_plan(self, plan_did):
+        self.order_calls += 1
+        return SimpleNamespace(success=self.order_success)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Resets the balance cache and replaces the monotonic clock with a controllable one."""
+    monkeypatch.setattr(ensure_balance, "_balance_cache", {})
+    monkeypatch.setattr(ensure_balance, "_balance_locks", {})
+    now = SimpleNamespace(value=100.0)
+    monkeypatch.setattr(ensure_balance.time, "monotonic", lambda: now.value)
+    return now
+
+
+def test_cache_hit_debits_without_refetching():
+    payments = FakePayments([10])
+
+    async def scenario():
+        assert await ensure_sufficient_balance("plan", payments, 3)
+        assert await ensure_sufficient_balance("plan", payments, 3)
+
+    asyncio.run(scenario())
+    assert payments.balance_calls == 1
+    assert ensure_balance._balance_cache["plan"] == (100.0 + BALANCE_CACHE_TTL, 4)
+
+
+def test_refetches_after_expiry(clock):
+    payments = FakePayments([10, 10])
+
+    async def scenario():
+        assert await ensure_sufficient_balance("plan", payments)
+        clock.value += BALANCE_CACHE_TTL + 1
+        assert await ensure_sufficient_balance("plan", payments)
+
+    asyncio.run(scenario())
+    assert payments.balance_calls == 2
+
+
+def test_refetches_when_cached_balance_is_insufficient():
+    payments = FakePayments([5, 20])
+
+    async def scenario():
+        assert await ensure_sufficient_balance("plan", payments, 4)
+        # Only 1 credit left in the cache, so this must query the real balance
+        assert await ensure_sufficient_balance("plan", payments, 4)
+
+    asyncio.run(scenario())
+    assert payments.balance_calls == 2
+    assert payments.order_calls == 0
+    assert ensure_balance._balance_cache["plan"][1] == 16
+
+
+def test_cache_entry_dropped_after_ordering_credits(clock):
+    payments = FakePayments([10, 0])
+
+    async def scenario():
+        assert await ensure_sufficient_balance("plan", payments, 5)
+        clock.value += BALANCE_CACHE_TTL + 1
+        assert await ensure_sufficient_balance("plan", payments, 5)
+
+    asyncio.run(scenario())
+    assert payments.order_calls == 1
+    assert "plan" not in ensure_balance._balance_cache
+
+
+def test_failed_order_returns_false():
+    payments = FakePayments([0], order_success=False)
+
+    assert asyncio.run(ensure_sufficient_balance("plan", payments)) is False
+    assert "plan" not in ensure_balance._balance_cache
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from payments_py.data_models import AgentExecutionStatus
+
+from utils import log_message as log_module
+from utils.log_message import _LogQueue, log_message, flush_logs
+
+
+class FakeAIProtocol:
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.fail_on = fail_on
+
+    async def log_task(self, task_log):
+        # Yield like a real socket emit so queued and direct sends can interleave
+        await asyncio.sleep(0)
+        if task_log.message == self.fail_on:
+            raise RuntimeError("socket closed")
+        self.sent.append(task_log.message)
+
+
+class FakePayments:
+    def __init__(self, fail_on=None):
+        self.ai_protocol = FakeAIProtocol(fail_on)
+
+
+@pytest.fixture(autouse=True)
+def log_queue(monkeypatch):
+    """Installs a fresh queue so no worker is shared between event loops."""
+    log_queue = _LogQueue()
+    monkeypatch.setattr(log_module, "_log_queue", log_queue)
+    return log_queue
+
+
+def test_plain_logs_are_queued_and_sent_in_order():
+    payments = FakePayments()
+
+    async def scenario():
+        for i in range(5):
+            await log_message(payments, "task", "info", f"message {i}")
+        # log_message returns before the logs are sent
+        assert payments.ai_protocol.sent == []
+        await flush_logs()
+
+    asyncio.run(scenario())
+    assert payments.ai_protocol.sent == [f"message {i}" for i in range(5)]
+
+
+def test_flush_drains_the_queue(log_queue):
+    payments = FakePayments()
+
+    async def scenario():
+        await log_message(payments, "task", "info", "message")
+        assert log_queue._queue.qsize() == 1
+        await flush_logs()
+        assert log_queue._queue.qsize() == 0
+
+    asyncio.run(scenario())
+    assert payments.ai_protocol.sent == ["message"]
+
+
+def test_status_logs_are_sent_before_returning_after_queued_logs():
+    payments = FakePayments()
+
+    async def scenario():
+        await log_message(payments, "task", "info", "progress 1")
+        await log_message(payments, "task", "info", "progress 2")
+        await log_message(payments, "task", "info", "done", AgentExecutionStatus.Completed)
+        assert payments.ai_protocol.sent == ["progress 1", "progress 2", "done"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_does_not_drop_later_logs():
+    payments = FakePayments(fail_on="message 1")
+
+    async def scenario():
+        for i in range(3):
+            await log_message(payments, "task", "info", f"message {i}")
+        await flush_logs()
+
+    asyncio.run(scenario())
+    assert payments.ai_protocol.sent == ["message 0", "message 2"]
@@ -0,0 +1,98 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import orchestrator
+from payments import ensure_balance
+
+
+class FakeAIProtocol:
+    """Completes every created task immediately, returning `artifacts_for(query)` as its output artifacts."""
+
+    def __init__(self, artifacts_for):
+        self.artifacts_for = artifacts_for
+        self.created = []
+        self.updates = []
+
+    async def create_task(self, did, task_data, callback):
+        task_id = f"task-{len(self.created)}"
+        self.created.append((task_id, task_data))
+
+        async def complete():
+            await callback(json.dumps({"task_id": task_id, "task_status": "Completed"}))
+
+        asyncio.get_running_loop().create_task(complete())
+        return SimpleNamespace(status_code=201)
+
+    def get_task_with_steps(self, did, task_id):
+        query = dict(self.created)[task_id]["query"]
+        task = {"task_status": "Completed", "output_artifacts": self.artifacts_for(query)}
+        return SimpleNamespace(json=lambda: {"task": task})
+
+    def update_step(self, did, task_id, step_id, step):
+        self.updates.append(step)
+
+
+class FakePayments:
+    def __init__(self, artifacts_for):
+        self.ai_protocol = FakeAIProtocol(artifacts_for)
+
+    def get_plan_balance(self, plan_did):
+        return SimpleNamespace(balance="100")
+
+
+@pytest.fixture(autouse=True)
+def isolate(monkeypatch):
+    async def log_message(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(orchestrator, "log_message", log_message)
+    monkeypatch.setattr(ensure_balance, "_balance_cache", {})
+    monkeypatch.setattr(ensure_balance, "_balance_locks", {})
+
+
+CHARACTERS = [{"name": "Ana", "look": "tall"}, {"name": "Bo", "look": "short"}]
+
+
+def run_image_step(payments):
+    step = {"did": "did", "task_id": "parent", "step_id": "step", "name": "generateImagesForCharacters",
+            "input_artifacts": json.dumps(CHARACTERS)}
+    asyncio.run(orchestrator.OrchestratorAgent(payments).handle_image_generation_for_characters(step))
+    return payments.ai_protocol.updates[-1]
+
+
+def test_fan_out_keeps_one_artifact_list_per_character(monkeypatch):
+    monkeypatch.setattr(orchestrator, "IMAGE_BATCH_ENABLED", False)
+    # The backend returns JSON-encoded artifacts, which must be decoded rather than split
+    payments = FakePayments(lambda query: json.dumps([f"https://img/{query}.png"]))
+
+    update = run_image_step(payments)
+
+    assert len(payments.ai_protocol.created) == 2
+    assert update["step_status"] == "Completed"
+    assert update["output_artifacts"] == [["https://img/tall.png"], ["https://img/short.png"]]
+
+
+def test_batched_mode_returns_the_batch_task_artifacts(monkeypatch):
+    monkeypatch.setattr(orchestrator, "IMAGE_BATCH_ENABLED", True)
+    payments = FakePayments(
+        lambda query: json.dumps([[f"https://img/{prompt}.png"] for prompt in json.loads(query)])
+    )
+
+    update = run_image_step(payments)
+
+    (_, task_data), = payments.ai_protocol.created
+    assert task_data["additional_params"] == [{"batch": True}]
+    assert update["step_status"] == "Completed"
+    assert update["output_artifacts"] == [["https://img/tall.png"], ["https://img/short.png"]]
+
+
+def test_non_list_artifacts_are_wrapped(monkeypatch):
+    monkeypatch.setattr(orchestrator, "IMAGE_BATCH_ENABLED", False)
+    payments = FakePayments(lambda query: f"https://img/{query}.png")
+
+    update = run_image_step(payments)
+
+    assert update["output_artifacts"] == [["https://img/tall.png"], ["https://img/short.png"]]
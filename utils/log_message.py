@@ -1,32 +1,89 @@
+import asyncio
 from payments_py import Payments
 from payments_py.data_models import TaskLog, AgentExecutionStatus
 from logger.logger import logger
 from typing import Optional
 
+_LOG_METHODS = {
+    "info": logger.info,
+    "warning": logger.warning,
+    "error": logger.error,
+    "debug": logger.debug
+}
+
+
+class _LogQueue:
+    """
+    Sends task logs to Nevermined from a background task so callers don't wait on each log_task emit.
+    Logs are sent one at a time, in the order they were submitted. The consumer task is started lazily
+    on the first submitted log.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, payments: Payments, task_log: TaskLog) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._consume())
+        self._queue.put_nowait((payments, task_log))
+
+    async def flush(self) -> None:
+        """Waits until every submitted log has been sent."""
+        if self._queue is not None and self._worker is not None and not self._worker.done():
+            await self._queue.join()
+
+    async def _consume(self) -> None:
+        while True:
+            payments, task_log = await self._queue.get()
+            try:
+                await _send(payments, task_log)
+            finally:
+                self._queue.task_done()
+
+
+async def _send(payments: Payments, task_log: TaskLog) -> None:
+    try:
+        await payments.ai_protocol.log_task(task_log)
+    except Exception as e:
+        logger.error(f"Failed to send task log to Nevermined: {e}")
+
+
+_log_queue = _LogQueue()
+
 
 async def log_message(payments: Payments, task_id: str, level: str, message: str, task_status: Optional[AgentExecutionStatus] = None) -> None:
     """
-    Logs a message to the console and updates the log on the Nevermined platform.
+    Logs a message to the console and sends the log to the Nevermined platform.
+    Plain logs are queued and sent in the background. Logs carrying a task status are sent before
+    returning, after any queued logs, so they reach Nevermined before the caller updates the step.
 
     Args:
         payments (Payments): Instance of the Payments API for interacting with Nevermined.
         task_id (str): The ID of the task associated with the log message.
         level (str): The level of the log (e.g., "info", "warning", "error").
         message (str): The message to log.
+        task_status (Optional[AgentExecutionStatus]): The task status to report, if any.
 
     Returns:
         None
     """
-    log_methods = {
-        "info": logger.info,
-        "warning": logger.warning,
-        "error": logger.error,
-        "debug": logger.debug
-    }
-
-    log_methods.get(level, logger.info)(f"{task_id} :: {message}")
+    _LOG_METHODS.get(level, logger.info)(f"{task_id} :: {message}")
+    task_log = TaskLog(task_id=task_id, level=level, message=message, task_status=task_status)
     if task_status is None:
-        task_log = TaskLog(task_id=task_id, level=level, message=message)
+        _log_queue.submit(payments, task_log)
     else:
-        task_log = TaskLog(task_id=task_id, level=level, message=message, task_status=task_status)
-    await payments.ai_protocol.log_task(task_log)
\ No newline at end of file
+        await _log_queue.flush()
+        await _send(payments, task_log)
+
+
+async def flush_logs() -> None:
+    """
+    Waits until all queued task logs have been sent to the Nevermined platform.
+
+    Returns:
+        None
+    """
+    await _log_queue.flush()
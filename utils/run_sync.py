@@ -0,0 +1,17 @@
+import asyncio
+from typing import Any, Callable
+
+
+async def run_sync(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking Payments API call in a worker thread so it doesn't stall the event loop.
+
+    Args:
+        fn (Callable): The blocking function to call.
+        *args: Positional arguments passed to `fn`.
+        **kwargs: Keyword arguments passed to `fn`.
+
+    Returns:
+        Any: The value returned by `fn`.
+    """
+    return await asyncio.to_thread(fn, *args, **kwargs)